@@ -1,10 +1,79 @@
+import hashlib
+import json
+import multiprocessing
 import operator
+import os
+import queue
+import random
+import re
+import sqlite3
+import sys
+import time
+import traceback
+from contextlib import closing
+from datetime import datetime
+from collections import Counter
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
 
 # Minimum at-bats to appear in batting order, fire/ice, and lineup rationale
 MIN_ABS = 4
 
+# Past fielding assignments for the season scheduler (Position = BENCH for bench appearances)
+LINEUP_HISTORY_FILE = "lineup_history.csv"
+BENCH = "BENCH"
+
+# Season scheduler fairness weights, traded off against candidate_score
+BENCH_FAIRNESS_WEIGHT = 400
+INFIELD_FAIRNESS_WEIGHT = 150
+
+# Fielding event log used for data-driven position weights and player skill
+FIELDING_EVENTS_FILE = "fielding_events.csv"
+FIELDING_EVENT_COLUMNS = ["Season", "Game", "Inning", "Position", "Player", "Chance", "Outcome"]
+FIELDING_PRIOR_CHANCES = 10  # league-average chances blended into each player's out rate
+
+# Per-roster time budgets (seconds) for the engine fuzz check
+ENGINE_TIME_BUDGETS = {
+    "best_assignment": 0.5,
+    "optimize_lineup": 1.0,
+    "optimize_lineup (parallel)": 5.0,
+    "backtrack + optimize_outfield": 1.0,
+    "optimize_team_athleticism": 0.1,
+}
+
+# Persistent results store; bump ENGINE_VERSION whenever the solvers' answers can change
+RESULTS_DB = "results_cache.sqlite"
+RESULTS_DB_MAX_BYTES = 5_000_000
+ENGINE_VERSION = 3
+
+# Longest chain of position changes the live substitution repair will consider
+MAX_REPAIR_MOVES = 3
+
+# Parallel exact search: split the tree at the first SPLIT_DEPTH positions across worker processes.
+# Off by default: with class grouping and bound pruning, serial search on 18-36 player rosters
+# takes 4-17ms against 70-120ms for a pool, and forking from inside the Streamlit server is risky.
+# Raise SEARCH_WORKERS (e.g. to os.cpu_count()) to opt in when running the engines headless.
+SEARCH_WORKERS = 1
+SPLIT_DEPTH = 2
+PARALLEL_MIN_PLAYERS = 18  # only consulted once SEARCH_WORKERS > 1
+
+# Bootstrap confidence intervals for small-sample batting stats
+BOOTSTRAP_REPLICATES = 2000
+BOOTSTRAP_CONFIDENCE = 0.90
+
+# Columnar store that box-score files are ingested into
+STATS_STORE_DIR = "stats_store"
+INGEST_CHUNK_ROWS = 5000
+DEFAULT_TEAM = "Freebasers"
+KEY_COLUMNS = ["Team", "Season", "Game", "Player"]
+STAT_COLUMNS = ["AB", "H", "1B", "2B", "3B", "HR", "R", "RBI", "BB", "SO", "SF"]
+# Narrow dtypes for the compact layout (per-game counts always fit in a byte)
+COMPACT_DTYPES = {"Game": "uint16", **{col: "uint8" for col in STAT_COLUMNS}}
+
 class PlayerBattingStatistics:
     def __init__(self, name, ab=0, runs=0, singles=0, doubles=0, triples=0, hr=0, rbi=0, bb=0, so=0, sf=0):
         self.name = name
@@ -162,7 +231,7 @@ def player_can_play_pos(player, pos):
             return True
         if "IF" in prefs and pos in infield_positions:
             return True
-        if "OF" in prefs and pos in outfield_positions:
+        if "OF" in prefs and pos in outfield_importance:
             return True
         return False
     
@@ -171,17 +240,75 @@ def player_can_play_pos(player, pos):
 
 def get_position_importance(pos):
     """Get the importance score for a position (higher = more important)"""
+    if fielding_model is not None and pos in fielding_model["importance"]:
+        return fielding_model["importance"][pos]
     if pos in outfield_importance:
         return outfield_importance[pos]
     elif pos in infield_importance:
         return infield_importance[pos]
     return 1  # Default importance
 
+def load_fielding_events():
+    """Load the fielding event log: one row per chance (Season, Game, Inning, Position, Player, Chance, Outcome)"""
+    try:
+        df_events = pd.read_csv(FIELDING_EVENTS_FILE, skipinitialspace=True)
+    except FileNotFoundError:
+        df_events = pd.DataFrame(columns=FIELDING_EVENT_COLUMNS)
+    df_events = df_events.dropna(how="all")
+    df_events["Player"] = df_events["Player"].astype(str).str.strip()
+    for col in ["Position", "Chance", "Outcome"]:
+        df_events[col] = df_events[col].astype(str).str.strip().str.upper()
+    return df_events[df_events["Position"].isin(infield_positions + list(outfield_importance))]
+
+def fielding_rates(df_events):
+    """Chances, outs and out rate per player per position, across all seasons"""
+    df = df_events.assign(Out=(df_events["Outcome"] == "OUT").astype(int))
+    rates = df.groupby(["Player", "Position"], as_index=False).agg(Chances=("Out", "size"), Outs=("Out", "sum"))
+    rates["Rate"] = (rates["Outs"] / rates["Chances"]).round(3)
+    return rates
+
+def build_fielding_model(df_events):
+    """
+    Data-driven scoring inputs from the fielding event log, or None if nothing is logged.
+    importance: chances per game at each position, rescaled so the infield and outfield keep the
+        same total weight as the hand-set tables (positions with no events keep their hand weight)
+    skill: each player's out rate at a position relative to that position's average, shrunk
+        toward average by FIELDING_PRIOR_CHANCES so a couple of plays can't swing it
+    """
+    if df_events.empty:
+        return None
+    df = df_events.assign(Out=(df_events["Outcome"] == "OUT").astype(int))
+    games = len(df[["Season", "Game"]].drop_duplicates())
+    by_position = df.groupby("Position")["Out"].agg(["size", "mean"])
+    per_game = by_position["size"] / games
+
+    importance = {}
+    for table in (infield_importance, outfield_importance):
+        seen = [pos for pos in table if pos in per_game.index]
+        total_weight = sum(table[pos] for pos in seen)
+        total_chances = per_game[seen].sum()
+        for pos in table:
+            importance[pos] = round(float(total_weight * per_game[pos] / total_chances), 2) if pos in seen else table[pos]
+
+    rates = df.groupby(["Player", "Position"], as_index=False)["Out"].agg(["size", "sum"])
+    position_rate = rates["Position"].map(by_position["mean"])
+    smoothed = (rates["sum"] + FIELDING_PRIOR_CHANCES * position_rate) / (rates["size"] + FIELDING_PRIOR_CHANCES)
+    rates["Skill"] = (smoothed / position_rate).where(position_rate > 0, 1.0).round(3)
+    skill = dict(zip(zip(rates["Player"], rates["Position"]), rates["Skill"].astype(float)))
+    return {"importance": importance, "skill": skill}
+
+def fielding_skill(player, pos):
+    """Player's fielding skill at a position relative to average (1.0 without a fielding model)"""
+    if fielding_model is None:
+        return 1.0
+    return fielding_model["skill"].get((player, pos), 1.0)
+
 def candidate_score(player, position):
     """
     Score a candidate for a position based on the priority order:
     1. Player's preferred position (highest priority)
-    2. Athleticism × Position importance (second priority)
+    2. Athleticism × Position importance (second priority), scaled by fielding skill
+       at the position when a fielding model is in use
     """
     prefs = all_players_info[player].get("prefs", [])
     ath_score = athleticism_rank.get(player, 0)
@@ -192,7 +319,7 @@ def candidate_score(player, position):
     
     # Priority 2: Athleticism × Position importance (medium weight)
     # This ensures more athletic players get more important positions
-    athleticism_importance_score = ath_score * pos_importance * 50
+    athleticism_importance_score = ath_score * pos_importance * fielding_skill(player, position) * 50
     
     return preference_bonus + athleticism_importance_score
 
@@ -203,7 +330,70 @@ def prioritized_candidates(candidates, position=None):
     # Sort by the new scoring system
     return sorted(candidates, key=lambda p: candidate_score(p, position), reverse=True)
 
-def optimize_lineup():
+def has_valid_lineup(players, game_positions):
+    """Whether every position can be filled by a different eligible player (bipartite matching)"""
+    holder = {}
+
+    def place(pos, seen):
+        for player in players:
+            if player not in seen and player_can_play_pos(player, pos):
+                seen.add(player)
+                if player not in holder or place(holder[player], seen):
+                    holder[player] = pos
+                    return True
+        return False
+
+    return all(place(pos, set()) for pos in game_positions)
+
+def max_assignment_score(table):
+    """
+    Exact best total for a score table (one row per position, one column per player, None where
+    the player can't play it) with every position filled by a different player, or -inf if that's
+    impossible. Hungarian algorithm on negated scores, O(positions^2 * players).
+    """
+    n, m = len(table), len(table[0]) if table else 0
+    if n == 0:
+        return 0
+    if n > m:
+        return float("-inf")
+    # Costlier than any swing the real scores can make, so a forbidden cell is only used if it must be
+    forbidden = 1 + 2 * sum(abs(s) for row in table for s in row if s is not None)
+    cost = [[-s if s is not None else forbidden for s in row] for row in table]
+
+    # Potentials u (positions) / v (players); owner[j] = position (1-based) holding player j
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    owner, way = [0] * (m + 1), [0] * (m + 1)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        slack = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while owner[j0]:
+            used[j0] = True
+            i0, delta, j1 = owner[j0], float("inf"), 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if reduced < slack[j]:
+                        slack[j], way[j] = reduced, j0
+                    if slack[j] < delta:
+                        delta, j1 = slack[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    slack[j] -= delta
+            j0 = j1
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    scores = [table[owner[j] - 1][j - 1] for j in range(1, m + 1) if owner[j]]
+    return float("-inf") if None in scores else sum(scores)
+
+def optimize_lineup(workers=SEARCH_WORKERS, min_players=PARALLEL_MIN_PLAYERS):
     """
     Optimize the lineup using a global optimization approach:
     1. Find all valid assignments for each position
@@ -211,46 +401,120 @@ def optimize_lineup():
     3. Return the lineup with the highest total score
     
     This ensures we get the globally optimal assignment rather than greedy local decisions.
+
+    Players who can play the same positions with the same score everywhere are interchangeable,
+    so the search decides how many of each class play where and only picks names at the end.
+    Positions are filled most constrained first, and each branch is bounded by the exact best
+    score the unused players could add (max_assignment_score), so the search walks almost
+    straight to the first optimal lineup in its search order.
+
+    Big rosters are split at the first SPLIT_DEPTH positions and searched on worker processes
+    that share the best score found so far; the result is the same lineup a serial search finds.
     """
-    def calculate_lineup_score(assignment):
-        """Calculate the total score for a lineup assignment"""
-        total_score = 0
-        for pos, player in assignment.items():
-            total_score += candidate_score(player, pos)
-        return total_score
-    
-    def find_best_lineup():
-        """Find the best lineup using a greedy approach with backtracking"""
+    def player_classes():
+        """Group available players by their score row (None where they can't play)"""
+        classes = {}
+        for p in available_players:
+            row = tuple(candidate_score(p, pos) if player_can_play_pos(p, pos) else None for pos in positions)
+            classes.setdefault(row, []).append(p)
+        return classes
+
+    # An impossible roster would otherwise be searched exhaustively before giving up
+    if not has_valid_lineup(available_players, positions):
+        return None
+
+    classes = player_classes()
+
+    # Fill the most constrained positions first (fewest players who can play them), as best_assignment does
+    order = sorted(
+        range(len(positions)), key=lambda i: sum(len(members) for row, members in classes.items() if row[i] is not None)
+    )
+
+    # Classes that can play the position at each depth, best score first (roster order on ties)
+    ranked = [
+        sorted((row for row in classes if row[i] is not None), key=lambda row: row[i], reverse=True) for i in order
+    ]
+    tolerance = 1e-6  # totals summed in a different order can differ in the last bits
+
+    def candidate_rows(remaining, depth):
+        """Classes that can still fill the position at this depth, best score first"""
+        return [row for row in ranked[depth] if remaining[row] > 0]
+
+    def bound(remaining, depth):
+        """Exact best total positions order[depth:] can still add from the players not yet used"""
+        open_positions = order[depth:]
+        unused = [row for row in classes for _ in range(min(remaining[row], len(open_positions)))]
+        return max_assignment_score([[row[i] for row in unused] for i in open_positions])
+
+    def find_best_lineup(prefix=(), shared=None):
+        """Find the first best lineup (in search order) starting with prefix, as (score, rows by depth)"""
         best_score = -1
-        best_assignment = None
-        
-        def backtrack_optimize(available_players, current_assignment, pos_index):
-            nonlocal best_score, best_assignment
-            
-            if pos_index == len(positions):
-                # Complete assignment found
-                score = calculate_lineup_score(current_assignment)
-                if score > best_score:
-                    best_score = score
-                    best_assignment = current_assignment.copy()
+        best_rows = None
+        remaining = {row: len(members) for row, members in classes.items()}
+        for row in prefix:
+            remaining[row] -= 1
+
+        # The bound is exact, so the best total under prefix is known before searching: descend
+        # through the first child (in search order) that can still reach it until a lineup does.
+        # Ties therefore resolve the same way however the tree is split across workers.
+        start = sum(row[order[depth]] for depth, row in enumerate(prefix))
+        target = start + bound(remaining, len(prefix))
+        known = shared.get_obj().value if shared is not None else -1  # unlocked: a stale value only prunes less
+        if target == float("-inf") or target < known - tolerance:
+            return best_score, best_rows
+
+        def backtrack_optimize(current_rows, depth, total):
+            nonlocal best_score, best_rows
+
+            if depth == len(order):
+                best_score = total
+                best_rows = list(current_rows)
+                if shared is not None:
+                    with shared.get_lock():
+                        shared.value = max(shared.value, total)
                 return
-            
-            pos = positions[pos_index]
-            candidates = [p for p in available_players if player_can_play_pos(p, pos)]
-            
-            # Sort candidates by their score for this position
-            sorted_candidates = prioritized_candidates(candidates, pos)
-            
-            for candidate in sorted_candidates:
-                new_available = available_players - {candidate}
-                current_assignment[pos] = candidate
-                backtrack_optimize(new_available, current_assignment, pos_index + 1)
-                del current_assignment[pos]
-        
-        backtrack_optimize(set(available_players), {}, 0)
-        return best_assignment
-    
-    return find_best_lineup()
+
+            pos_index = order[depth]
+            for row in candidate_rows(remaining, depth):
+                remaining[row] -= 1
+                if total + row[pos_index] + bound(remaining, depth + 1) >= target - tolerance:
+                    current_rows.append(row)
+                    backtrack_optimize(current_rows, depth + 1, total + row[pos_index])
+                    current_rows.pop()
+                remaining[row] += 1
+                if best_rows is not None:
+                    return
+
+        backtrack_optimize(list(prefix), len(prefix), start)
+        return best_score, best_rows
+
+    if workers > 1 and len(available_players) >= min_players and len(positions) > SPLIT_DEPTH:
+        # Independent subtrees for every way to fill the first SPLIT_DEPTH positions, in serial search order
+        prefixes = [()]
+        for depth in range(SPLIT_DEPTH):
+            expanded = []
+            for prefix in prefixes:
+                remaining = {row: len(members) for row, members in classes.items()}
+                for row in prefix:
+                    remaining[row] -= 1
+                expanded += [prefix + (row,) for row in candidate_rows(remaining, depth)]
+            prefixes = expanded
+        results = run_parallel_search(prefixes, lambda _, prefix, shared: find_best_lineup(prefix, shared), -1, workers)
+        # The earliest subtree holding an optimum has the lineup a serial search finds first
+        top = max((score for score, _ in results), default=-1)
+        best_score, best_rows = next(
+            ((score, rows) for score, rows in results if rows is not None and score >= top - tolerance), (-1, None)
+        )
+    else:
+        best_score, best_rows = find_best_lineup()
+
+    if best_rows is None:
+        return None
+
+    # Expand classes back to names, in roster order
+    members = {row: iter(players) for row, players in classes.items()}
+    rows_by_position = dict(zip(order, best_rows))
+    return {pos: next(members[rows_by_position[i]]) for i, pos in enumerate(positions)}
 
 def optimize_team_athleticism(assignments):
     """
@@ -274,11 +538,11 @@ def optimize_team_athleticism(assignments):
                     continue
                 
                 # Calculate current and potential scores
-                current_score = (athleticism_rank.get(player1, 0) * get_position_importance(pos1) + 
-                               athleticism_rank.get(player2, 0) * get_position_importance(pos2))
+                current_score = (athleticism_rank.get(player1, 0) * get_position_importance(pos1) * fielding_skill(player1, pos1) + 
+                               athleticism_rank.get(player2, 0) * get_position_importance(pos2) * fielding_skill(player2, pos2))
                 
-                potential_score = (athleticism_rank.get(player1, 0) * get_position_importance(pos2) + 
-                                 athleticism_rank.get(player2, 0) * get_position_importance(pos1))
+                potential_score = (athleticism_rank.get(player1, 0) * get_position_importance(pos2) * fielding_skill(player1, pos2) + 
+                                 athleticism_rank.get(player2, 0) * get_position_importance(pos1) * fielding_skill(player2, pos1))
                 
                 # Only swap if it improves athleticism × importance AND doesn't violate strong preferences
                 if potential_score > current_score:
@@ -300,8 +564,11 @@ def optimize_team_athleticism(assignments):
     
     return assignments
 
-def backtrack(assignments, used, pos_idx=0):
+def backtrack(assignments, used, pos_idx=0, stop=None):
     """Fallback backtracking algorithm if the main optimization fails"""
+    if stop is not None and stop():
+        return None
+
     if pos_idx == len(positions):
         return assignments
 
@@ -311,7 +578,7 @@ def backtrack(assignments, used, pos_idx=0):
     for player in prioritized_candidates(candidates, pos):
         assignments[pos] = player
         used.add(player)
-        result = backtrack(assignments, used, pos_idx + 1)
+        result = backtrack(assignments, used, pos_idx + 1, stop)
         if result is not None:
             return result
         used.remove(player)
@@ -319,48 +586,596 @@ def backtrack(assignments, used, pos_idx=0):
 
     return None
 
+def parallel_backtrack(workers=SEARCH_WORKERS):
+    """
+    Run the fallback backtrack split at the first SPLIT_DEPTH positions on worker processes.
+    Workers share the earliest subtree that found a lineup and abandon any later subtree,
+    so the result is the lineup a serial backtrack({}, set()) would return.
+    """
+    if not has_valid_lineup(available_players, positions):
+        return None
+    if workers <= 1 or len(available_players) < PARALLEL_MIN_PLAYERS or len(positions) <= SPLIT_DEPTH:
+        return backtrack({}, set())
+
+    prefixes = [{}]
+    for pos in positions[:SPLIT_DEPTH]:
+        prefixes = [
+            {**prefix, pos: player}
+            for prefix in prefixes
+            for player in prioritized_candidates(
+                [p for p in available_players if p not in prefix.values() and player_can_play_pos(p, pos)], pos
+            )
+        ]
+
+    def solve(index, prefix, shared):
+        result = backtrack(dict(prefix), set(prefix.values()), len(prefix), stop=lambda: shared.get_obj().value < index)
+        if result is not None:
+            with shared.get_lock():
+                shared.value = min(shared.value, index)
+        return result
+
+    results = run_parallel_search(prefixes, solve, float("inf"), workers)
+    return next((result for result in results if result is not None), None)
+
+def run_parallel_search(subproblems, solve, initial_bound, workers=SEARCH_WORKERS):
+    """
+    Solve independent subproblems on forked worker processes and return the results in
+    subproblem order. solve(index, subproblem, shared) gets a shared float (starting at
+    initial_bound) the workers use to prune against each other. A worker that raises or dies
+    raises RuntimeError here instead of leaving the caller waiting. Falls back to a serial loop
+    where fork isn't available.
+    """
+    if not subproblems:
+        return []
+    if "fork" not in multiprocessing.get_all_start_methods():
+        shared = multiprocessing.Value("d", initial_bound)
+        return [solve(i, subproblem, shared) for i, subproblem in enumerate(subproblems)]
+
+    # Fork so workers inherit the roster globals without pickling the search functions
+    ctx = multiprocessing.get_context("fork")
+    shared = ctx.Value("d", initial_bound)
+    tasks, results = ctx.Queue(), ctx.Queue()
+    workers = min(workers, len(subproblems))
+    for i in range(len(subproblems)):
+        tasks.put(i)
+    for _ in range(workers):
+        tasks.put(None)
+
+    def work():
+        while (i := tasks.get()) is not None:
+            try:
+                results.put((i, solve(i, subproblems[i], shared), None))
+            except BaseException:
+                results.put((i, None, traceback.format_exc()))
+                return
+
+    processes = [ctx.Process(target=work, daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    ordered = [None] * len(subproblems)
+    try:
+        remaining = len(subproblems)
+        while remaining:
+            running = any(p.is_alive() for p in processes)
+            try:
+                i, result, error = results.get(timeout=1)
+            except queue.Empty:
+                # A worker killed outright (OOM, signal) never reports back, so check on them
+                dead = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+                if dead or not running:
+                    raise RuntimeError(f"search worker exited with code {dead[0] if dead else 0} before finishing")
+                continue
+            if error is not None:
+                raise RuntimeError(f"search worker failed on subproblem {i}:\n{error}")
+            ordered[i] = result
+            remaining -= 1
+    finally:
+        for process in processes:
+            if process.is_alive() and remaining:
+                process.terminate()
+            process.join()
+    return ordered
+
 def optimize_outfield(assignments):
     '''Given the current assignments, optimize the outfield position based on outfield importance and athleticism'''
-    #get all outfielders
-    outfielders = [v for k, v in assignments.items() if k in outfield_positions]
-    
-    #sort outfielders by athleticism
-    outfielders.sort(key=lambda x: athleticism_rank.get(x, 0), reverse=True)
-
-    # reassign outfielders to the positions in order of athleticism and importance (outfield_importance)
-    for pos in outfield_importance:
-        player = outfielders.pop(0)
-        assignments[pos] = player
+    #get the outfield spots actually in use (3 or 4 depending on roster size)
+    outfield_spots = [pos for pos in assignments if pos in outfield_importance]
+    outfielders = [assignments[pos] for pos in outfield_spots]
+
+    # reassign outfielders so the most athletic get the most important spots they can play
+    best, _ = best_assignment(
+        outfielders,
+        outfield_spots,
+        lambda player, pos: athleticism_rank.get(player, 0) * get_position_importance(pos),
+        incumbent={pos: assignments[pos] for pos in outfield_spots},
+    )
+    assignments.update(best)
     return assignments
 
-def calculate_optimal_batting_order(stats: TeamBattingStatistics, omit: list[str] = [""]):
+def lineup_positions(num_players):
+    """Positions to fill for a game with the given number of available players"""
+    if num_players < 10:
+        return infield_positions + ["LF", "LCF", "RF"]
+    return infield_positions + ["LF", "LCF", "RCF", "RF"]
+
+def best_assignment(players, game_positions, score, incumbent=None):
+    """
+    Exact best assignment of players to positions for an arbitrary score(player, pos).
+    Fills the most constrained positions first and prunes any branch whose
+    optimistic bound (best remaining score per open position) can't beat the incumbent.
+    A known valid lineup can be passed as incumbent to warm start the pruning.
+    Returns (assignment, total score), or (None, None) if no valid lineup exists.
+    """
+    table = {
+        pos: sorted(((score(p, pos), p) for p in players if player_can_play_pos(p, pos)), reverse=True)
+        for pos in game_positions
+    }
+    order = sorted(game_positions, key=lambda pos: len(table[pos]))
+    if not all(table[pos] for pos in order):
+        return None, None
+
+    # bound[i] = best possible score for positions order[i:]
+    bound = [0] * (len(order) + 1)
+    for i in range(len(order) - 1, -1, -1):
+        bound[i] = bound[i + 1] + table[order[i]][0][0]
+
+    best_score = float("-inf")
+    best = None
+    if incumbent is not None and set(incumbent) == set(game_positions) and all(
+        p in players and player_can_play_pos(p, pos) for pos, p in incumbent.items()
+    ) and len(set(incumbent.values())) == len(incumbent):
+        best_score = sum(score(p, pos) for pos, p in incumbent.items())
+        best = dict(incumbent)
+    current = {}
+    used = set()
+
+    def search(i, total):
+        nonlocal best_score, best
+        if i == len(order):
+            if total > best_score:
+                best_score = total
+                best = current.copy()
+            return
+        pos = order[i]
+        for s, player in table[pos]:
+            if total + s + bound[i + 1] <= best_score:
+                break  # candidates are sorted, nothing further down can do better
+            if player in used:
+                continue
+            used.add(player)
+            current[pos] = player
+            search(i + 1, total + s)
+            used.discard(player)
+            del current[pos]
+
+    search(0, 0)
+    if best is None:
+        return None, None
+    return {pos: best[pos] for pos in game_positions}, best_score
+
+def repair_lineup(assignments, batting_order, available, departing=None, arriving=None):
+    """
+    Minimum-disruption repair when a player leaves and/or arrives mid-game.
+    Each open position is filled by a chain of moves starting there: field players slide over
+    and a bench player comes in at the end of the chain. The chain with the fewest position
+    changes wins, then the best candidate_score. The batting order keeps everyone's relative
+    order; an arriving player takes the departing player's slot, or bats last.
+    Returns (assignments, batting_order, available, changed positions); assignments is None
+    if fewer than 9 players remain.
+    """
+    available = [p for p in available if p != departing]
+    if arriving and arriving not in available:
+        available.append(arriving)
+
+    if departing in batting_order:
+        slot = batting_order.index(departing)
+        batting_order = [p for p in batting_order if p != departing]
+        if arriving and arriving not in batting_order:
+            batting_order.insert(slot, arriving)
+    if arriving and arriving not in batting_order:
+        batting_order = batting_order + [arriving]
+
+    if len(available) < 9:
+        return None, batting_order, available, []
+
+    # Positions can come and go when the roster crosses 10 (RCF)
+    game_positions = lineup_positions(len(available))
+    field = {pos: p for pos, p in assignments.items() if p in available and pos in game_positions}
+    holes = [pos for pos in game_positions if pos not in field]
+
+    for hole in holes:
+        field = repair_hole(field, hole, [p for p in available if p not in field.values()])
+        if field is None:
+            # No short chain works, fall back to a full re-solve
+            field, _ = best_assignment(available, game_positions, candidate_score)
+            break
+    if field is None:
+        return None, batting_order, available, []
+
+    field = {pos: field[pos] for pos in game_positions}
+    changed = [pos for pos in game_positions if assignments.get(pos) != field[pos]]
+    return field, batting_order, available, changed
+
+def repair_hole(field, hole, bench):
+    """
+    Fill one open position by the shortest chain of moves (up to MAX_REPAIR_MOVES changed
+    positions), breaking ties by total candidate_score. Returns the repaired field, or None.
+    """
+    best = None
+    best_key = None
+
+    def extend(current, hole, filled, changes):
+        nonlocal best, best_key
+        for player in bench:
+            if player_can_play_pos(player, hole):
+                repaired = {**current, hole: player}
+                key = (changes + 1, -sum(candidate_score(p, pos) for pos, p in repaired.items()))
+                if best_key is None or key < best_key:
+                    best, best_key = repaired, key
+        if changes + 1 >= MAX_REPAIR_MOVES:
+            return
+        # Slide a field player into the hole, opening up their old position
+        for pos, player in current.items():
+            if pos not in filled and player_can_play_pos(player, hole):
+                moved = {q: p for q, p in current.items() if q != pos}
+                moved[hole] = player
+                extend(moved, pos, filled | {hole}, changes + 1)
+
+    extend(field, hole, set(), 0)
+    return best
+
+def load_lineup_history(season):
+    """Load past fielding assignments for a season from LINEUP_HISTORY_FILE"""
+    try:
+        df_history = pd.read_csv(LINEUP_HISTORY_FILE)
+    except FileNotFoundError:
+        df_history = pd.DataFrame(columns=["Season", "Game", "Player", "Position"])
+    df_history["Player"] = df_history["Player"].astype(str).str.strip()
+    return df_history[df_history["Season"] == season]
+
+def fairness_counts(df_history):
+    """
+    Tally per-player fairness counts from past games:
+    bench / infield = actual appearances, expected_bench / expected_infield = what an
+    even rotation would have given them (bench spots / infield spots shared across everyone there).
+    """
+    totals = {key: Counter() for key in ["bench", "infield", "expected_bench", "expected_infield"]}
+    if df_history.empty:
+        return totals
+    df = df_history.copy()
+    per_game = df.groupby("Game")["Player"].transform("count")
+    benched = df["Position"] == BENCH
+    bench_spots = benched.groupby(df["Game"]).transform("sum")
+    df["bench"] = benched.astype(int)
+    df["infield"] = df["Position"].isin(infield_positions).astype(int)
+    df["expected_bench"] = bench_spots / per_game
+    df["expected_infield"] = len(infield_positions) / per_game
+    sums = df.groupby("Player")[list(totals)].sum()
+    for key in totals:
+        totals[key].update(sums[key].to_dict())
+    return totals
+
+class SeasonScheduler:
+    """
+    Schedules upcoming games' lineups jointly. Each game is solved exactly with
+    candidate_score plus fairness terms from the season totals (history + the other
+    scheduled games), and games are re-solved until no lineup changes. The fairness terms
+    are the marginal cost of quadratic penalties on bench and infield counts drifting from
+    an even rotation, so every re-solve can only improve the whole-season objective.
+    """
+    def __init__(self, df_history, bench_weight=BENCH_FAIRNESS_WEIGHT, infield_weight=INFIELD_FAIRNESS_WEIGHT, max_passes=5):
+        self.bench_weight = bench_weight
+        self.infield_weight = infield_weight
+        self.max_passes = max_passes
+        self.totals = fairness_counts(df_history)
+        self.games = {}  # game -> {"available": [...], "assignments": {pos: player} or None}
+
+    def fair_score(self, player, position):
+        # Playing at all pays back bench debt; infield pays back (or spends) infield share
+        bench_debt = self.totals["bench"][player] - self.totals["expected_bench"][player]
+        score = candidate_score(player, position) + self.bench_weight * (2 * bench_debt + 1)
+        if position in infield_positions:
+            infield_gap = self.totals["infield"][player] - self.totals["expected_infield"][player]
+            score -= self.infield_weight * (2 * infield_gap + 1)
+        return score
+
+    def schedule(self, upcoming):
+        """Solve every upcoming game (dict of game -> available players) jointly"""
+        for game, players in upcoming.items():
+            self._set_available(game, players)
+        self._settle(list(upcoming))
+        return self.games
+
+    def update_availability(self, game, players):
+        """
+        Re-solve after one game's availability changes (or a game is added). Only that game
+        and the games sharing a player whose totals moved are revisited.
+        """
+        old = set(self.games[game]["available"]) if game in self.games else set()
+        self._set_available(game, players)
+        self._settle([game], moved=old ^ set(players))
+        return self.games
+
+    def drop_game(self, game):
+        """Remove a game from the schedule and rebalance the games it affected"""
+        if game not in self.games:
+            return self.games
+        moved = set(self.games[game]["available"])
+        self._set_available(game, [])
+        del self.games[game]
+        self._settle([], moved=moved)
+        return self.games
+
+    def _set_available(self, game, players):
+        entry = self.games.get(game)
+        if entry:
+            self._count(entry, -1)
+            self._expect(entry, -1)
+        entry = {"available": list(players), "assignments": None}
+        self.games[game] = entry
+        self._expect(entry, 1)
+
+    def _expect(self, entry, sign):
+        players = entry["available"]
+        if not players:
+            return
+        game_positions = lineup_positions(len(players))
+        expected_bench = max(len(players) - len(game_positions), 0) / len(players)
+        expected_infield = min(len(infield_positions), len(players)) / len(players)
+        for p in players:
+            self.totals["expected_bench"][p] += sign * expected_bench
+            self.totals["expected_infield"][p] += sign * expected_infield
+
+    def _count(self, entry, sign):
+        if entry["assignments"] is None:
+            return
+        for p in entry["available"]:
+            status = self._status(entry, p)
+            if status == BENCH:
+                self.totals["bench"][p] += sign
+            elif status == "IF":
+                self.totals["infield"][p] += sign
+
+    @staticmethod
+    def _status(entry, player):
+        for pos, p in (entry["assignments"] or {}).items():
+            if p == player:
+                return "IF" if pos in infield_positions else "OF"
+        return BENCH
+
+    def _settle(self, dirty, moved=()):
+        pending = list(dirty)
+        pending += [g for g in self.games if g not in pending and set(self.games[g]["available"]) & set(moved)]
+        solves = 0
+        while pending and solves < self.max_passes * max(len(self.games), 1):
+            game = pending.pop(0)
+            entry = self.games[game]
+            before = {p: self._status(entry, p) for p in entry["available"]}
+            self._count(entry, -1)
+            if len(entry["available"]) >= 9:
+                game_positions = lineup_positions(len(entry["available"]))
+                entry["assignments"], _ = best_assignment(entry["available"], game_positions, self.fair_score)
+            else:
+                entry["assignments"] = None
+            self._count(entry, 1)
+            solves += 1
+
+            changed = {p for p in entry["available"] if self._status(entry, p) != before[p]}
+            for other, other_entry in self.games.items():
+                if other != game and other not in pending and changed & set(other_entry["available"]):
+                    pending.append(other)
+
+    def fairness_table(self):
+        """Season fairness totals (history + scheduled games) per player"""
+        players = sorted(set().union(*(set(c) for c in self.totals.values())))
+        rows = [{
+            "Player": p,
+            "Bench": self.totals["bench"][p],
+            "Expected Bench": round(self.totals["expected_bench"][p], 1),
+            "Infield": self.totals["infield"][p],
+            "Expected Infield": round(self.totals["expected_infield"][p], 1),
+        } for p in players]
+        return pd.DataFrame(rows, columns=["Player", "Bench", "Expected Bench", "Infield", "Expected Infield"])
+
+    def to_history(self, season):
+        """Scheduled games in LINEUP_HISTORY_FILE format, ready to append once they're played"""
+        rows = []
+        for game, entry in self.games.items():
+            if entry["assignments"] is None:
+                continue
+            for pos in lineup_positions(len(entry["available"])):
+                rows.append({"Season": season, "Game": game, "Player": entry["assignments"][pos], "Position": pos})
+            for p in entry["available"]:
+                if self._status(entry, p) == BENCH:
+                    rows.append({"Season": season, "Game": game, "Player": p, "Position": BENCH})
+        return pd.DataFrame(rows, columns=["Season", "Game", "Player", "Position"])
+
+def lineup_sensitivity(players, game_positions, optimum=None):
+    """
+    For every player's athleticism rating and every position weight, find how far it can
+    move before the optimal lineup changes. optimum is the lineup to measure from (pass the
+    one being shown, since ties have several); best_assignment's is used if none is given.
+
+    With one parameter moving, each lineup's score is a line in that parameter, and the slope
+    only depends on where the player sits (athleticism) or who plays the position (weight).
+    So the exact thresholds come from the best lineup with one player pinned to one spot:
+    each (player, spot) pin is solved once from a shared score matrix, warm started from the
+    current optimum, and reused by both the player's and the position's analysis.
+    """
+    matrix = {(p, pos): candidate_score(p, pos) for p in players for pos in game_positions if player_can_play_pos(p, pos)}
+    score = lambda p, pos: matrix[(p, pos)]
+    if optimum is None:
+        optimum, optimum_score = best_assignment(players, game_positions, score)
+    else:
+        optimum_score = sum(score(p, pos) for pos, p in optimum.items())
+    if optimum is None:
+        return pd.DataFrame()
+    spot_of = {p: pos for pos, p in optimum.items()}
+    pinned_cache = {}
+
+    def pinned(player, pos):
+        """Best lineup with player fixed at pos (None = bench), as (assignment, score)"""
+        key = (player, pos)
+        if key in pinned_cache:
+            return pinned_cache[key]
+        if spot_of.get(player) == pos:
+            pinned_cache[key] = (optimum, optimum_score)
+            return pinned_cache[key]
+        # Warm start: current optimum with the player swapped into the pinned spot
+        incumbent = dict(optimum)
+        displaced = optimum.get(pos) if pos else None
+        if spot_of.get(player):
+            incumbent[spot_of[player]] = displaced
+        if pos:
+            incumbent[pos] = player
+        incumbent = {q: p for q, p in incumbent.items() if p is not None and q != pos}
+        rest_positions = [q for q in game_positions if q != pos]
+        rest, rest_score = best_assignment([p for p in players if p != player], rest_positions, score, incumbent)
+        if rest is None:
+            pinned_cache[key] = (None, float("-inf"))
+        else:
+            lineup = dict(rest)
+            if pos:
+                lineup[pos] = player
+            pinned_cache[key] = (lineup, rest_score + (matrix[key] if pos else 0))
+        return pinned_cache[key]
+
+    def describe(lineup):
+        moves = [f"{pos}: {optimum[pos]}→{lineup[pos]}" for pos in game_positions if lineup[pos] != optimum[pos]]
+        return ", ".join(moves)
+
+    def thresholds(value, lines, current):
+        """lines: option -> (slope, lineup, score at value). Returns (down, up, lineup at down, lineup at up)"""
+        current_slope = lines[current][0]
+        down = up = None
+        down_lineup = up_lineup = None
+        for option, (slope, lineup, total) in lines.items():
+            if option == current or lineup is None or slope == current_slope:
+                continue
+            crossing = value + (optimum_score - total) / (slope - current_slope)
+            if slope > current_slope and (up is None or crossing < up):
+                up, up_lineup = crossing, lineup
+            elif slope < current_slope and crossing >= 0 and (down is None or crossing > down):
+                down, down_lineup = crossing, lineup
+        return down, up, down_lineup, up_lineup
+
+    rows = []
+    def add_row(parameter, value, down, up, down_lineup, up_lineup):
+        margins = [abs(value - t) for t in (down, up) if t is not None]
+        nearest = None
+        if margins:
+            nearest = down_lineup if down is not None and abs(value - down) == min(margins) else up_lineup
+        rows.append({
+            "Parameter": parameter,
+            "Value": value,
+            "Holds Down To": round(down, 2) if down is not None else None,
+            "Holds Up To": round(up, 2) if up is not None else None,
+            "Margin": round(min(margins), 2) if margins else None,
+            "Nearest Change": describe(nearest) if nearest else "",
+        })
+
+    for player in players:
+        value = athleticism_rank.get(player, 0)
+        lines = {}
+        spots = [pos for pos in game_positions if (player, pos) in matrix]
+        if len(players) > len(game_positions):
+            spots.append(None)
+        for pos in spots:
+            lineup, total = pinned(player, pos)
+            slope = get_position_importance(pos) * fielding_skill(player, pos) * 50 if pos else 0
+            lines[pos] = (slope, lineup, total)
+        add_row(f"{player} athleticism", value, *thresholds(value, lines, spot_of.get(player)))
+
+    for pos in game_positions:
+        value = get_position_importance(pos)
+        lines = {}
+        for player in players:
+            if (player, pos) in matrix:
+                lineup, total = pinned(player, pos)
+                lines[player] = (athleticism_rank.get(player, 0) * fielding_skill(player, pos) * 50, lineup, total)
+        add_row(f"{pos} importance", value, *thresholds(value, lines, optimum[pos]))
+
+    df = pd.DataFrame(rows)
+    return df.sort_values("Margin", na_position="last").reset_index(drop=True)
+
+def bootstrap_batting_intervals(df_games, replicates=BOOTSTRAP_REPLICATES, confidence=BOOTSTRAP_CONFIDENCE, seed=0):
+    """
+    Bootstrap confidence intervals for AVG/OBP/SLG/OPS, resampling each player's games
+    with replacement. Every player is resampled at once: one (player x replicate x game)
+    draw, with slots past a player's own game count masked out.
+    Returns a DataFrame indexed by Player with "<STAT> Lo" / "<STAT> Hi" columns.
+    """
+    stat_cols = ["AB", "1B", "2B", "3B", "HR", "BB", "SF"]
+    codes, names = pd.factorize(df_games["Player"])
+    names = np.asarray(names)
+    counts = np.bincount(codes, minlength=len(names))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    values = df_games[stat_cols].to_numpy(dtype=np.int64)[np.argsort(codes, kind="stable")]
+
+    rng = np.random.default_rng(seed)
+    max_games = counts.max()
+    offsets = (rng.random((len(names), replicates, max_games)) * counts[:, None, None]).astype(np.int64)
+    in_range = (np.arange(max_games)[None, :] < counts[:, None])[:, None, :, None]
+    sums = (values[starts[:, None, None] + offsets] * in_range).sum(axis=2)
+    ab, singles, doubles, triples, hr, bb, sf = np.moveaxis(sums, -1, 0)
+
+    hits = singles + doubles + triples + hr
+    total_bases = singles + 2 * doubles + 3 * triples + 4 * hr
+    pa = ab + bb + sf
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.where(ab > 0, hits / ab, 0.0)
+        obp = np.where(pa > 0, (hits + bb) / pa, 0.0)
+        slg = np.where(ab > 0, total_bases / ab, 0.0)
+    samples = {"AVG": avg, "OBP": obp, "SLG": slg, "OPS": obp + slg}
+
+    tail = (1 - confidence) / 2
+    intervals = pd.DataFrame(index=pd.Index(names, name="Player"))
+    for stat, sample in samples.items():
+        lo, hi = np.quantile(sample, [tail, 1 - tail], axis=1)
+        intervals[f"{stat} Lo"] = lo.round(3)
+        intervals[f"{stat} Hi"] = hi.round(3)
+    return intervals
+
+def format_interval(lo, hi):
+    return f"{lo:.3f}–{hi:.3f}"
+
+def calculate_optimal_batting_order(stats: TeamBattingStatistics, omit: list[str] = [""], intervals: pd.DataFrame = None):
     '''Given the current hitting stats, return the optimal batting lineup
     Philosophy:
     Top of the order (1–3): Need high OBP and speed/athleticism — guys who get on base to set the table.
     Middle (3–5): Best power hitters/sluggers — drive runs in.
     Lower/middle (6–8): Consistent contact hitters — keep rallies alive.
     Bottom (9–10): Weaker hitters, but ideally people who can still get on base and "turn the lineup over" back to the top.
+
+    If bootstrap intervals are given, OBP and SLG are ranked on their lower confidence bound
+    so a hot handful of at-bats doesn't outrank a proven hitter.
     '''
+    def ranked(stat):
+        if intervals is None:
+            return operator.attrgetter(stat)
+        return lambda p: intervals.loc[p.name, f"{stat.upper()} Lo"]
+    obp, slg = ranked('obp'), ranked('slg')
+
     players = list(stats.players.values())
     # Filter out players with fewer than MIN_ABS at-bats and omitted players
     players = [p for p in players if p.ab >= MIN_ABS and p.name.strip() not in omit]
     lineup = []
     
     # 1. Leadoff hitter: Top 4 OBP players, then lowest SLG among them. Second hitter next lowest SLG.
-    top_obp_players = sorted(players, key=operator.attrgetter('obp'), reverse=True)[:4]
-    leadoff_candidates = sorted(top_obp_players, key=operator.attrgetter('slg'))
+    top_obp_players = sorted(players, key=obp, reverse=True)[:4]
+    leadoff_candidates = sorted(top_obp_players, key=slg)
     lineup.append(leadoff_candidates[0])  # Lowest SLG among top 4 OBP
     lineup.append(leadoff_candidates[1])  # Second lowest SLG among top 4 OBP
     
     # 3-5. Third, fourth are cleanup hitters: Top 2 SLG players among remaining. Fifth is highest remaining SLG
     remaining_players = [p for p in players if p not in lineup]
-    top_slg_players = sorted(remaining_players, key=operator.attrgetter('slg'), reverse=True)
+    top_slg_players = sorted(remaining_players, key=slg, reverse=True)
     lineup.extend([top_slg_players[1], top_slg_players[0], top_slg_players[2]])  # 2nd and 1st SLG
     
     # 6-X. Middle order: Remaining players by SLG (excluding last batter)
     remaining_players = [p for p in players if p not in lineup]
-    last_batter = max(remaining_players, key=operator.attrgetter('obp'))  # Highest OBP for "turnover"
-    middle_order = [p for p in sorted(remaining_players, key=operator.attrgetter('slg'), reverse=True) if p != last_batter]
+    last_batter = max(remaining_players, key=obp)  # Highest OBP for "turnover"
+    middle_order = [p for p in sorted(remaining_players, key=slg, reverse=True) if p != last_batter]
     lineup.extend(middle_order)
     
     # Last. Last batter: Highest OBP to "turn the lineup over"
@@ -369,16 +1184,54 @@ def calculate_optimal_batting_order(stats: TeamBattingStatistics, omit: list[str
     # Create DataFrame with proper indexing
     return pd.DataFrame(lineup, index=range(1, len(lineup) + 1), columns=["Player"]).rename_axis("Batting Position")
 
+def season_totals(df_games):
+    """Season totals per player"""
+    return df_games.groupby("Player", as_index=False, observed=True)[STAT_COLUMNS].sum()
+
+def batting_teams(df_totals):
+    """Season totals as (everyone with an at-bat, players with MIN_ABS+ at-bats for the batting order)"""
+    team = TeamBattingStatistics("Freebasers")
+    lineup_team = TeamBattingStatistics("Freebasers")
+    for _, row in df_totals.iterrows():
+        player = PlayerBattingStatistics(
+            row["Player"].strip(),
+            ab=row["AB"],
+            runs=row["R"],
+            singles=row["1B"],
+            doubles=row["2B"],
+            triples=row["3B"],
+            hr=row["HR"],
+            rbi=row["RBI"],
+            bb=row["BB"],
+            so=row["SO"],
+            sf=row["SF"],
+        )
+        if row["AB"] > 0:
+            team.add_player(player)
+        if row["AB"] >= MIN_ABS:
+            lineup_team.add_player(player)
+    return team, lineup_team
+
+def batting_order_inputs(stats_digest, season, lower_bound):
+    """Cache inputs for a computed batting order, shared by the Hitting and Fielding pages"""
+    return {
+        "stats": stats_digest,
+        "season": season,
+        "min_abs": MIN_ABS,
+        "lower_bound": lower_bound,
+        "bootstrap": [BOOTSTRAP_REPLICATES, BOOTSTRAP_CONFIDENCE],
+    }
+
 def extract_name(x):
     return x.name
 
 def find_fire_ice(df_games):
         # only get last 3 games of stats
-        max_game = max(df_games['Game'])
+        max_game = int(df_games['Game'].max())
         # remove players with 0 AB
         df_games = df_games[df_games["AB"] > 0]
         df_games_l3 = df_games[df_games["Game"] > max_game - 3]
-        df_games_l3_totals = df_games_l3.groupby("Player", as_index=False).sum()
+        df_games_l3_totals = df_games_l3.groupby("Player", as_index=False, observed=True)[STAT_COLUMNS].sum()
         team_l3 = TeamBattingStatistics("Freebasers L3")
         for _, row in df_games_l3_totals.iterrows():
             if row["AB"] >= MIN_ABS:
@@ -402,11 +1255,8 @@ def find_fire_ice(df_games):
 
         return fire, ice
 
-def add_fire_ice(x, fire, ice):
+def add_fire_ice(x, fire_names, ice_names):
     # add fire and ice symbols to names
-    fire_names = [f.name for f in fire]
-    ice_names = [i.name for i in ice]
-
     if x in fire_names:
         return f"{x}🔥"
     elif x in ice_names:
@@ -414,6 +1264,430 @@ def add_fire_ice(x, fire, ice):
     else:
         return x
     
+def normalize_box_score(df, team=DEFAULT_TEAM):
+    """
+    Normalize one chunk of a box-score file: canonical header names, duplicated
+    headers dropped (pandas reads a repeated HR as HR.1), stripped names, blank rows removed.
+    """
+    canonical = {c.lower(): c for c in KEY_COLUMNS + STAT_COLUMNS + ["PA"]}
+    renamed = {}
+    for col in df.columns:
+        name = str(col).strip()
+        base = re.sub(r"\.\d+$", "", name)
+        if base != name and base.lower() in canonical and canonical[base.lower()] in renamed.values():
+            continue  # repeated header, keep the first
+        renamed[col] = canonical.get(name.lower(), name)
+    df = df[list(renamed)].rename(columns=renamed)
+    df = df.dropna(how="all")
+    if "Team" not in df.columns:
+        df["Team"] = team
+    for col in ["Team", "Season", "Player"]:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+    return df
+
+def validate_box_score(df, seen_keys):
+    """
+    Split a normalized chunk into (valid rows, rejected rows with a Reason).
+    Checks counts are whole and non-negative, H <= AB, PA >= AB, and that
+    (Team, Season, Game, Player) hasn't been seen before. Adds accepted keys to seen_keys.
+    Rejected rows keep the values as read, so the report shows what was wrong.
+    """
+    original = df
+    df = df.copy()
+    reasons = pd.Series("", index=df.index)
+    numeric = {col: pd.to_numeric(df[col], errors="coerce") for col in ["Game"] + STAT_COLUMNS if col in df.columns}
+    for col, values in numeric.items():
+        bad = values.isna() | ~np.isfinite(values) | (values < 0) | (values % 1 != 0) | (values > np.iinfo(COMPACT_DTYPES[col]).max)
+        reasons[bad & (reasons == "")] = f"bad {col}"
+        df[col] = values.where(~bad, 0).astype("int64")
+
+    for col in ["Season", "Player"]:
+        reasons[df[col].isin(["", "nan"]) & (reasons == "")] = f"missing {col}"
+
+    hits = df["1B"] + df["2B"] + df["3B"] + df["HR"]
+    reported_hits = df["H"] if "H" in df.columns else hits
+    reasons[((hits > df["AB"]) | (reported_hits > df["AB"])) & (reasons == "")] = "H > AB"
+    pa = df["AB"] + df["BB"] + df["SF"]
+    if "PA" in df.columns:
+        reported_pa = pd.to_numeric(df["PA"], errors="coerce")
+        bad_pa = reported_pa.isna() | ~np.isfinite(reported_pa) | (reported_pa < 0) | (reported_pa % 1 != 0)
+        reasons[bad_pa & (reasons == "")] = "bad PA"
+        reasons[(reported_pa < df["AB"]) & (reasons == "")] = "PA < AB"
+    df["H"] = hits
+    df["PA"] = pa
+
+    keys = list(zip(df["Team"], df["Season"], df["Game"], df["Player"]))
+    for i, key in zip(df.index, keys):
+        if reasons[i]:
+            continue
+        if key in seen_keys:
+            reasons[i] = "duplicate (Season, Game, Player)"
+        else:
+            seen_keys.add(key)
+
+    valid = df[reasons == ""][KEY_COLUMNS + STAT_COLUMNS]
+    rejected = original[reasons != ""].assign(Reason=reasons[reasons != ""])
+    return valid, rejected
+
+def stats_store_parts(store_dir=STATS_STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(os.path.join(store_dir, f) for f in os.listdir(store_dir) if f.endswith(".arrow"))
+
+def read_stats_store(store_dir=STATS_STORE_DIR, columns=None):
+    """Read the columnar stats store (optionally only some columns)"""
+    parts = [read_stats_part(path, columns) for path in stats_store_parts(store_dir)]
+    if not parts:
+        return pd.DataFrame(columns=columns or KEY_COLUMNS + STAT_COLUMNS)
+    return concat_game_stats(parts)
+
+def append_stats_store(df, store_dir=STATS_STORE_DIR):
+    """Append rows to the store as a new part file, never rewriting existing parts"""
+    os.makedirs(store_dir, exist_ok=True)
+    # Number past the highest existing part so a removed part never gets its name reused
+    indexes = [int(match.group(1)) for path in stats_store_parts(store_dir) if (match := re.fullmatch(r"part-(\d+)\.arrow", os.path.basename(path)))]
+    path = os.path.join(store_dir, f"part-{max(indexes, default=-1) + 1:05d}.arrow")
+    compact_game_stats(df).reset_index(drop=True).to_feather(path + ".tmp", compression="uncompressed")
+    os.replace(path + ".tmp", path)
+    return path
+
+def compact_game_stats(df):
+    """Dictionary-encode the repeated name columns and narrow the counting stats"""
+    df = df.copy()
+    for col in ["Team", "Season", "Player"]:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def concat_game_stats(frames):
+    """Concatenate compact frames, merging category dictionaries instead of falling back to strings"""
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals([f[col] for f in frames], ignore_order=True)
+        else:
+            columns[col] = np.concatenate([f[col].to_numpy() for f in frames])
+    return pd.DataFrame(columns)
+
+def read_stats_part(path, columns=None, team=None, season=None):
+    """
+    Memory-map one store part. Parts are uncompressed Arrow IPC, so nothing is parsed or decompressed,
+    and rows can be narrowed to one team / season before anything is converted to pandas.
+    """
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    if team is not None or season is not None:
+        keys = table.select(["Team", "Season"]).to_pandas()
+        mask = np.ones(len(keys), dtype=bool)
+        if team is not None:
+            mask &= (keys["Team"] == team).to_numpy()
+        if season is not None:
+            mask &= (keys["Season"] == season).to_numpy()
+        table = table.filter(pa.array(mask))
+    return table.to_pandas(split_blocks=True)
+
+def load_game_stats(season, csv_path="game_stats.csv", store_dir=STATS_STORE_DIR, team=DEFAULT_TEAM):
+    """
+    One season's per-game batting rows in the compact layout: the hand-entered CSV plus
+    any ingested box scores for the team that the CSV doesn't already cover.
+    """
+    df_csv = normalize_box_score(pd.read_csv(csv_path, skipinitialspace=True), team)
+    df_csv = df_csv[df_csv["Season"] == season][KEY_COLUMNS + STAT_COLUMNS]
+    frames = [compact_game_stats(df_csv)]
+
+    # Only this team and season's rows leave each memory-mapped part
+    store_frames = [read_stats_part(path, team=team, season=season) for path in stats_store_parts(store_dir)]
+    store_frames = [df for df in store_frames if not df.empty]
+    if store_frames:
+        df_store = concat_game_stats(store_frames)
+        known = set(zip(df_csv["Game"].astype(int), df_csv["Player"]))
+        new_rows = pd.Series(
+            [key not in known for key in zip(df_store["Game"].astype(int), df_store["Player"])], index=df_store.index, dtype=bool
+        )
+        frames.append(df_store[new_rows])
+
+    df_games = concat_game_stats(frames)
+    for col in ["Team", "Season", "Player"]:
+        df_games[col] = df_games[col].cat.remove_unused_categories()
+    return df_games
+
+def ingest_box_scores(source_dir, store_dir=STATS_STORE_DIR, team=DEFAULT_TEAM, chunksize=INGEST_CHUNK_ROWS):
+    """
+    Stream every box-score CSV in source_dir into the stats store. Files are read in chunks
+    and valid rows are flushed to a new part once chunksize rows are buffered, so memory stays
+    bounded by the chunk size plus the set of known (Team, Season, Game, Player) keys.
+    Returns (rows ingested, DataFrame of rejected rows with File and Reason).
+    """
+    df_keys = read_stats_store(store_dir, columns=KEY_COLUMNS)
+    seen_keys = set(zip(df_keys["Team"].astype(str), df_keys["Season"].astype(str), df_keys["Game"].astype(int), df_keys["Player"].astype(str)))
+    buffered, rejected = [], []
+    buffered_rows = ingested = 0
+
+    def flush():
+        nonlocal buffered, buffered_rows, ingested
+        if buffered_rows:
+            append_stats_store(pd.concat(buffered, ignore_index=True), store_dir)
+            ingested += buffered_rows
+        buffered, buffered_rows = [], 0
+
+    def read_chunks(name):
+        """A file that can't be parsed (empty, truncated, bad encoding) is rejected instead of ending the import"""
+        try:
+            yield from pd.read_csv(os.path.join(source_dir, name), chunksize=chunksize, skipinitialspace=True)
+        except (ValueError, OSError) as error:
+            rejected.append(pd.DataFrame([{"File": name, "Reason": f"unreadable: {type(error).__name__}: {error}"}]))
+
+    for name in sorted(os.listdir(source_dir)):
+        if not name.lower().endswith(".csv"):
+            continue
+        for chunk in read_chunks(name):
+            chunk = normalize_box_score(chunk, team)
+            missing = [col for col in KEY_COLUMNS + STAT_COLUMNS if col not in chunk.columns and col != "H"]
+            if missing:
+                rejected.append(pd.DataFrame([{"File": name, "Reason": f"missing columns: {', '.join(missing)}"}]))
+                break
+            valid, bad = validate_box_score(chunk, seen_keys)
+            if not bad.empty:
+                rejected.append(bad.assign(File=name))
+            buffered.append(valid)
+            buffered_rows += len(valid)
+            if buffered_rows >= chunksize:
+                flush()
+    flush()
+
+    df_rejected = pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame(columns=["File", "Reason"])
+    return ingested, df_rejected
+
+def random_roster(rng, num_players):
+    """Random roster for fuzzing: prefs / no lists drawn from every position plus IF / OF"""
+    pool = infield_positions + list(outfield_importance) + ["IF", "OF"]
+    players, athleticism = {}, {}
+    for i in range(1, num_players + 1):
+        name = f"Player {i}"
+        prefs = rng.sample(pool, rng.choice([0, 0, 1, 1, 2, 3]))
+        no = rng.sample([pos for pos in infield_positions + list(outfield_importance) if pos not in prefs], rng.choice([0, 0, 0, 1, 2]))
+        players[name] = {"prefs": prefs, "no": no}
+        athleticism[name] = rng.randint(1, 10)
+    return players, athleticism
+
+def lineup_problems(assignments):
+    """Why a lineup isn't valid for the current positions / available players (empty if it is)"""
+    if set(assignments) != set(positions):
+        return [f"positions {sorted(assignments)} != {sorted(positions)}"]
+    problems = []
+    players = list(assignments.values())
+    if len(set(players)) != len(players):
+        problems.append("player used twice")
+    for pos, player in assignments.items():
+        if player not in available_players:
+            problems.append(f"{player} not available")
+        elif not player_can_play_pos(player, pos):
+            problems.append(f"{player} can't play {pos}")
+    return problems
+
+def fuzz_engines(seeds=range(100), budgets=ENGINE_TIME_BUDGETS, parallel=False):
+    """
+    Differential check of the lineup engines on seeded random rosters of 9-15 players.
+    best_assignment is the reference optimum: optimize_lineup (serial, and with parallel=True
+    split across forked workers) must match its score, the athleticism swap pass must keep an optimal lineup optimal, and the fallback
+    backtrack + optimize_outfield path must return a valid lineup whenever one exists.
+    Any engine slower than its budget (seconds) also fails.
+    Returns a list of failures as {"Seed", "Engine", "Problem"} dicts.
+    """
+    roster_globals = ["all_players_info", "athleticism_rank", "available_players", "outfield_positions", "positions", "fielding_model"]
+    namespace = globals()
+    saved = {name: namespace[name] for name in roster_globals if name in namespace}
+    failures = []
+    crashed = object()
+
+    def timed(seed, engine, run):
+        start = time.perf_counter()
+        try:
+            result = run()
+        except Exception as error:
+            failures.append({"Seed": seed, "Engine": engine, "Problem": f"raised {type(error).__name__}: {error}"})
+            return crashed
+        elapsed = time.perf_counter() - start
+        if elapsed > budgets[engine]:
+            failures.append({"Seed": seed, "Engine": engine, "Problem": f"took {elapsed:.3f}s, budget {budgets[engine]}s"})
+        return result
+
+    def check(seed, engine, assignments, reference_score, exact):
+        if assignments is crashed:
+            return
+        if assignments is None:
+            if reference_score is not None:
+                failures.append({"Seed": seed, "Engine": engine, "Problem": "no lineup, but one exists"})
+            return
+        problems = lineup_problems(assignments)
+        if reference_score is None:
+            problems.append("returned a lineup, but none is valid")
+        elif not problems:
+            score = sum(candidate_score(p, pos) for pos, p in assignments.items())
+            if score > reference_score + 1e-6 or (exact and score < reference_score - 1e-6):
+                problems.append(f"score {score} vs optimal {reference_score}")
+        for problem in problems:
+            failures.append({"Seed": seed, "Engine": engine, "Problem": problem})
+
+    try:
+        for seed in seeds:
+            rng = random.Random(seed)
+            roster, athleticism = random_roster(rng, rng.randint(9, 15))
+            namespace["all_players_info"] = roster
+            namespace["athleticism_rank"] = athleticism
+            namespace["available_players"] = list(roster)
+            namespace["outfield_positions"] = ["LF", "LCF", "RCF", "RF"] if len(roster) >= 10 else ["LF", "LCF", "RF"]
+            namespace["positions"] = infield_positions + namespace["outfield_positions"]
+            namespace["fielding_model"] = None
+
+            result = timed(seed, "best_assignment", lambda: best_assignment(available_players, positions, candidate_score))
+            if result is crashed:
+                continue
+            reference, reference_score = result
+            check(seed, "best_assignment", reference, reference_score, True)
+
+            lineup = timed(seed, "optimize_lineup", lambda: optimize_lineup(workers=1))
+            check(seed, "optimize_lineup", lineup, reference_score, True)
+            if parallel and "fork" in multiprocessing.get_all_start_methods():
+                split = timed(seed, "optimize_lineup (parallel)", lambda: optimize_lineup(workers=2, min_players=0))
+                check(seed, "optimize_lineup (parallel)", split, reference_score, True)
+                if split is not crashed and lineup is not crashed and split != lineup:
+                    failures.append({"Seed": seed, "Engine": "optimize_lineup (parallel)", "Problem": "different lineup than serial"})
+
+            fallback = timed(seed, "backtrack + optimize_outfield", lambda: parallel_backtrack(workers=1))
+            if fallback is not None and fallback is not crashed:
+                fallback = timed(seed, "backtrack + optimize_outfield", lambda: optimize_outfield(fallback))
+            check(seed, "backtrack + optimize_outfield", fallback, reference_score, False)
+
+            if reference is not None:
+                swapped = timed(seed, "optimize_team_athleticism", lambda: optimize_team_athleticism(dict(reference)))
+                check(seed, "optimize_team_athleticism", swapped, reference_score, True)
+    finally:
+        for name in roster_globals:
+            if name in saved:
+                namespace[name] = saved[name]
+            else:
+                namespace.pop(name, None)
+    return failures
+
+def file_digest(*paths):
+    """sha256 over the contents of the given files (a missing file hashes as empty)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode())
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+def game_stats_digest(csv_path="game_stats.csv", store_dir=STATS_STORE_DIR):
+    """
+    Cache key for the batting stats: the hand-entered CSV's contents plus each store part's name
+    and size. Parts are append-only and never reuse a name, so this changes whenever the data
+    does without reading the archive.
+    """
+    digest = hashlib.sha256(file_digest(csv_path).encode())
+    for path in stats_store_parts(store_dir):
+        digest.update(f"{os.path.basename(path)}:{os.path.getsize(path)}".encode())
+    return digest.hexdigest()
+
+def content_hash(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def roster_version():
+    """Content hash of everything the fielding optimizer reads from the roster tables"""
+    return content_hash({
+        "players": all_players_info,
+        "athleticism": athleticism_rank,
+        "infield_importance": infield_importance,
+        "outfield_importance": outfield_importance,
+        "positions": positions,
+    })
+
+class ResultsStore:
+    """
+    SQLite-backed store of computed results (lineups, batting orders, fire/ice), keyed by a
+    content hash of their inputs plus ENGINE_VERSION, so answers survive a restart.
+    Least recently used entries are evicted once the stored values pass max_bytes.
+    """
+    def __init__(self, path=RESULTS_DB, max_bytes=RESULTS_DB_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "computed_at TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    @staticmethod
+    def key(kind, inputs):
+        return content_hash({"kind": kind, "engine": ENGINE_VERSION, "inputs": inputs})
+
+    def get(self, kind, inputs):
+        """(value, computed_at) for these inputs, or None if nothing is stored"""
+        key = self.key(kind, inputs)
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            row = conn.execute("SELECT value, computed_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def put(self, kind, inputs, value):
+        """Record a result and return when it was computed"""
+        computed_at = datetime.now().isoformat(timespec="seconds")
+        encoded = json.dumps(value)
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, kind, value, size, computed_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(kind, inputs), kind, encoded, len(encoded), computed_at, time.time()),
+            )
+            self._evict(conn)
+        return computed_at
+
+    def cached(self, kind, inputs, compute):
+        """(value, computed_at), calling compute() and recording the result only on a miss"""
+        stored = self.get(kind, inputs)
+        if stored is not None:
+            return stored
+        value = compute()
+        return value, self.put(kind, inputs, value)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", evict)
+
+def starting_batting_order(season, players, results_store):
+    """
+    Batting order to open a live game with: the season's computed order (the same cached result
+    the Hitting page shows) for players who have one, then everyone else in roster order.
+    """
+    _, lineup_team = batting_teams(season_totals(load_game_stats(season)))
+    order = []
+    if len(lineup_team.players) >= 6:
+        order, _ = results_store.cached(
+            "batting_order",
+            batting_order_inputs(game_stats_digest(), season, False),
+            lambda: [p.name for p in calculate_optimal_batting_order(lineup_team)["Player"]],
+        )
+    return [p for p in order if p in players] + [p for p in players if p not in order]
+
 def display_lineup_rationale(lineup):
     st.subheader("Lineup Rationale")
 
@@ -502,11 +1776,6 @@ def display_lineup_rationale(lineup):
 
 
 
-# st.set_page_config(layout="wide")
-st.title("Freebasers Softball")
-tab_choice = st.selectbox("Select Page", ["Hitting", "Fielding"])
-# tab1, tab2 = st.tabs(["Fielding", "Hitting"])
-
 shared_roster = {
     "Kevo": {"prefs": ["SS"]},
     "Werth": {"prefs": [], "no": ["P", "3B"]},
@@ -547,6 +1816,9 @@ outfield_importance = {
 
 nine_players = False
 
+# Optional data-driven scoring model from the fielding event log (see build_fielding_model)
+fielding_model = None
+
 # Infield position importance (higher = more action)
 infield_importance = {
     "P": 2,
@@ -584,6 +1856,25 @@ athleticism_by_season = {
     },
 }
 
+# Headless engine check, so solver changes can be verified without the UI:
+#   python softball.py --check-engines [rosters]
+if "--check-engines" in sys.argv:
+    args = sys.argv[sys.argv.index("--check-engines") + 1:]
+    num_rosters = int(args[0]) if args else 100
+    start = time.perf_counter()
+    # Outside the Streamlit server it's safe to fork, so the parallel search is checked too
+    failures = fuzz_engines(range(num_rosters), parallel=True)
+    elapsed = time.perf_counter() - start
+    for failure in failures:
+        print(f"seed {failure['Seed']}: {failure['Engine']}: {failure['Problem']}")
+    print(f"{len(failures)} engine check failures across {num_rosters} rosters ({elapsed:.1f}s)")
+    sys.exit(1 if failures else 0)
+
+# st.set_page_config(layout="wide")
+st.title("Freebasers Softball")
+tab_choice = st.selectbox("Select Page", ["Hitting", "Fielding"])
+# tab1, tab2 = st.tabs(["Fielding", "Hitting"])
+
 season = st.selectbox("Select Season", ["Fall2026", "Fall2025"])
 players_info = players_by_season[season]
 default_athleticism = athleticism_by_season[season]
@@ -591,10 +1882,8 @@ default_athleticism = athleticism_by_season[season]
 if tab_choice == "Hitting":
     st.header("Hitting Stats")
     
-    # Load per-game CSV
-    df_games = pd.read_csv("game_stats.csv")
-    df_games["Player"] = df_games["Player"].astype(str).str.strip()
-    df_games = df_games[df_games["Season"] == season]
+    # Load per-game rows (game_stats.csv plus any ingested box scores) in the compact layout
+    df_games = load_game_stats(season)
     if df_games.empty or df_games["AB"].sum() == 0:
         st.info("No hitting stats entered for this season yet.")
         st.stop()
@@ -612,34 +1901,29 @@ if tab_choice == "Hitting":
     }).copy()
     
     # Aggregate season totals per player
-    df_totals = df_games.groupby("Player", as_index=False).sum()
+    df_totals = season_totals(df_games)
 
     # Season totals include anyone with an at-bat; batting order still needs MIN_ABS
-    team = TeamBattingStatistics("Freebasers")
-    lineup_team = TeamBattingStatistics("Freebasers")
-    for _, row in df_totals.iterrows():
-        player = PlayerBattingStatistics(
-            row["Player"].strip(),
-            ab=row["AB"],
-            runs=row["R"],
-            singles=row["1B"],
-            doubles=row["2B"],
-            triples=row["3B"],
-            hr=row["HR"],
-            rbi=row["RBI"],
-            bb=row["BB"],
-            so=row["SO"],
-            sf=row["SF"],
-        )
-        if row["AB"] > 0:
-            team.add_player(player)
-        if row["AB"] >= MIN_ABS:
-            lineup_team.add_player(player)
+    team, lineup_team = batting_teams(df_totals)
 
     # Convert to DataFrame (ready for Streamlit)
     df_season, df_season_totals = team.to_dataframe(include_totals=True)
-    fire, ice = find_fire_ice(df_games)
-    df_season['Player'] = df_season['Player'].apply(lambda x: add_fire_ice(x, fire, ice))
+    intervals = bootstrap_batting_intervals(df_games)
+    show_intervals = st.checkbox(f"Show {BOOTSTRAP_CONFIDENCE:.0%} confidence intervals")
+    if show_intervals:
+        for stat in ["AVG", "OBP", "SLG", "OPS"]:
+            df_season[f"{stat} CI"] = df_season["Player"].map(
+                lambda x: format_interval(intervals.loc[x, f"{stat} Lo"], intervals.loc[x, f"{stat} Hi"])
+            )
+    results_store = ResultsStore()
+    stats_digest = game_stats_digest()
+    fire_ice, fire_ice_computed_at = results_store.cached(
+        "fire_ice",
+        {"stats": stats_digest, "season": season, "min_abs": MIN_ABS},
+        lambda: [[p.name for p in group] for group in find_fire_ice(df_games)],
+    )
+    fire_names, ice_names = fire_ice
+    df_season['Player'] = df_season['Player'].apply(lambda x: add_fire_ice(x, fire_names, ice_names))
 
     st.subheader("Season Totals")
     
@@ -659,6 +1943,10 @@ if tab_choice == "Hitting":
         "SLG": st.column_config.NumberColumn("SLG", format="%.3f", width="small"),
         "OPS": st.column_config.NumberColumn("OPS", format="%.3f", width="small"),
         "ISO": st.column_config.NumberColumn("ISO", format="%.3f", width="small"),
+        "AVG CI": st.column_config.TextColumn("AVG CI", width="small"),
+        "OBP CI": st.column_config.TextColumn("OBP CI", width="small"),
+        "SLG CI": st.column_config.TextColumn("SLG CI", width="small"),
+        "OPS CI": st.column_config.TextColumn("OPS CI", width="small"),
     }
     
     st.dataframe(
@@ -673,7 +1961,9 @@ if tab_choice == "Hitting":
         use_container_width=True, 
         hide_index=True
     )
-    st.caption('Last 3 Games: 🔥 = OBP + (SLG/2) > 1.15, ❄️ = OBP + (SLG/2) < 0.75, max 3 per category')
+    st.caption(f'Last 3 Games: 🔥 = OBP + (SLG/2) > 1.15, ❄️ = OBP + (SLG/2) < 0.75, max 3 per category (computed {fire_ice_computed_at})')
+    if show_intervals:
+        st.caption(f"CI = {BOOTSTRAP_CONFIDENCE:.0%} bootstrap interval from resampling each player's games ({BOOTSTRAP_REPLICATES} replicates)")
 
     # Read the original game_stats.csv file for export
     with open("game_stats.csv", "r") as file:
@@ -687,6 +1977,18 @@ if tab_choice == "Hitting":
         help="Download the complete game statistics data as a CSV file"
     )
     
+    with st.expander("Import Box Scores"):
+        box_score_dir = st.text_input("Folder of box-score CSVs (one file per game)", value="box_scores")
+        if st.button("Ingest box scores"):
+            if not os.path.isdir(box_score_dir):
+                st.error(f"Folder not found: {box_score_dir}")
+            else:
+                ingested, df_rejected = ingest_box_scores(box_score_dir)
+                st.success(f"Added {ingested} player-game rows to {STATS_STORE_DIR}/")
+                if not df_rejected.empty:
+                    st.warning(f"{len(df_rejected)} rows rejected:")
+                    st.dataframe(df_rejected, use_container_width=True, hide_index=True)
+    
     # --- Per Game Totals Section ---
     st.subheader("Per Game Totals")    
     
@@ -755,7 +2057,7 @@ if tab_choice == "Hitting":
         )
         df_player_games["OPS"] = df_player_games["OBP"] + df_player_games["SLG"]
         df_player_games["ISO"] = df_player_games["SLG"] - df_player_games["AVG"]
-        df_player_games = df_player_games.drop('Player', axis=1)
+        df_player_games = df_player_games.drop(['Team', 'Player'], axis=1)
 
         
         
@@ -793,7 +2095,18 @@ if tab_choice == "Hitting":
     if len(lineup_team.players) < 6:
         st.info(f"Batting order appears after at least 6 players have {MIN_ABS}+ at-bats.")
     else:
-        df = calculate_optimal_batting_order(lineup_team)
+        rank_on_lower_bound = st.checkbox("Rank on lower confidence bound (favor proven hitters over small samples)")
+        batting_order, batting_order_computed_at = results_store.cached(
+            "batting_order",
+            batting_order_inputs(stats_digest, season, rank_on_lower_bound),
+            lambda: [p.name for p in calculate_optimal_batting_order(
+                lineup_team, intervals=intervals if rank_on_lower_bound else None
+            )["Player"]],
+        )
+        df = pd.DataFrame(
+            [lineup_team.players[name] for name in batting_order], index=range(1, len(batting_order) + 1), columns=["Player"]
+        ).rename_axis("Batting Position")
+        st.caption(f"Batting order computed {batting_order_computed_at}")
         display_df = df
         display_df = display_df["Player"].apply(extract_name)
         st.dataframe(display_df)
@@ -854,17 +2167,45 @@ if tab_choice == "Fielding":
     positions = infield_positions + outfield_positions
     
 
-    # Try the new optimization first, fall back to backtracking if needed
-    assignments = optimize_lineup()
-    if assignments is None:
-        # Fall back to the original backtracking approach
-        assignments = backtrack({}, set())
+    # Optional: position weights and per-player skill from the fielding event log
+    if st.checkbox("Score with fielding data (position weights and player skill from fielding_events.csv)"):
+        df_events = load_fielding_events()
+        fielding_model = build_fielding_model(df_events)
+        if fielding_model is None:
+            st.info(f"No fielding events logged in {FIELDING_EVENTS_FILE} yet, using the hand-set weights.")
+        elif st.checkbox("Show Fielding Data"):
+            st.write("Position importance (hand-set → from fielding data):")
+            st.table([
+                {"Position": pos, "Hand-set": {**infield_importance, **outfield_importance}[pos], "From Data": weight}
+                for pos, weight in fielding_model["importance"].items()
+            ])
+            st.write("Fielding rates by player and position (all seasons):")
+            df_rates = fielding_rates(df_events)
+            df_rates["Skill"] = [fielding_skill(p, pos) for p, pos in zip(df_rates["Player"], df_rates["Position"])]
+            st.dataframe(df_rates, use_container_width=True, hide_index=True)
+
+    def compute_lineup():
+        # Try the new optimization first, fall back to backtracking if needed
+        assignments = optimize_lineup()
+        if assignments is None:
+            # Fall back to the original backtracking approach
+            assignments = parallel_backtrack()
+            if assignments:
+                assignments = optimize_outfield(assignments)
+
+        # Apply team athleticism optimization
         if assignments:
-            assignments = optimize_outfield(assignments)
+            assignments = optimize_team_athleticism(assignments)
+        return assignments
 
-    # Apply team athleticism optimization
-    if assignments:
-        assignments = optimize_team_athleticism(assignments)
+    # Serve a previously computed lineup for the same roster, availability and engine
+    results_store = ResultsStore()
+    lineup_inputs = {
+        "roster": roster_version(),
+        "availability": sorted(available_players),
+        "fielding_events": file_digest(FIELDING_EVENTS_FILE) if fielding_model is not None else None,
+    }
+    assignments, lineup_computed_at = results_store.cached("lineup", lineup_inputs, compute_lineup)
 
     if assignments is None:
         st.error("No valid lineup found, which should not happen with enough players.")
@@ -874,6 +2215,7 @@ if tab_choice == "Fielding":
         
 
     st.subheader("Starting Lineup")
+    st.caption(f"Computed {lineup_computed_at}")
     st.table([{ "Position": pos, "Player": player } for pos, player in sorted(assignments.items(), key=lambda x: positions.index(x[0]))])
 
     # Debug: Show lineup with athleticism and preferences
@@ -897,12 +2239,129 @@ if tab_choice == "Fielding":
                     ath = athleticism_rank.get(candidate, 0)
                     prefs = all_players_info[candidate].get("prefs", [])
                     pref_bonus = 1000 if pos in prefs else 0
-                    ath_imp_score = ath * get_position_importance(pos) * 50
+                    ath_imp_score = ath * get_position_importance(pos) * fielding_skill(candidate, pos) * 50
                     st.write(f"  {candidate}: Score={score} (Pref={pref_bonus}, Ath×Imp={ath_imp_score})")
 
+    if st.checkbox("Show Sensitivity Analysis"):
+        st.write("How far each rating or position weight can move before the optimal lineup changes (most fragile first):")
+        # Measure from the optimizer's own lineup: on ties best_assignment can settle on a different one
+        st.dataframe(
+            lineup_sensitivity(available_players, positions, optimum=optimize_lineup()), use_container_width=True, hide_index=True
+        )
+        st.caption("Thresholds are for the optimizer's lineup before the athleticism swap pass. A margin of 0 means a tie: another lineup scores the same today.")
+
     subs = [p for p in available_players if p not in assignments.values()]
     st.header("Substitutes / Bench")
     if subs:
         st.write(", ".join(subs))
     else:
-        st.write("No subs available.")
\ No newline at end of file
+        st.write("No subs available.")
+    # --- Differential fuzz check of the lineup engines ---
+    num_rosters = st.slider("Random rosters to check", 10, 500, 100, step=10)
+    if st.button("Run Engine Check"):
+        start = time.perf_counter()
+        failures = fuzz_engines(range(num_rosters))
+        elapsed = time.perf_counter() - start
+        if failures:
+            st.error(f"{len(failures)} engine check failures across {num_rosters} rosters ({elapsed:.1f}s)")
+            st.dataframe(pd.DataFrame(failures), use_container_width=True, hide_index=True)
+        else:
+            st.success(f"All engines valid, in agreement and within budget on {num_rosters} rosters ({elapsed:.1f}s)")
+
+    # --- Live in-game substitutions ---
+    if st.checkbox("Live Substitutions"):
+        st.header("Live Substitutions")
+        start_game = st.button("Start game from this lineup")
+        # A live game belongs to one season, and can't keep players who dropped off the roster
+        # (a removed guest); new guests can still arrive without restarting it
+        live_stale = st.session_state.get("live_season") != season or any(
+            p not in all_players_info for p in st.session_state.get("live_available", [])
+        )
+        if start_game or live_stale:
+            st.session_state["live_season"] = season
+            st.session_state["live_assignments"] = dict(assignments)
+            st.session_state["live_available"] = list(available_players)
+            st.session_state["live_batting_order"] = starting_batting_order(season, available_players, results_store)
+
+        live_order_text = st.text_area(
+            "Batting order (one name per line)", "\n".join(st.session_state["live_batting_order"])
+        )
+        st.session_state["live_batting_order"] = [p.strip() for p in live_order_text.splitlines() if p.strip()]
+
+        live_available = st.session_state["live_available"]
+        departing = st.selectbox("Player leaving", ["(nobody)"] + live_available)
+        arriving = st.selectbox("Player arriving", ["(nobody)"] + [p for p in all_players_info if p not in live_available])
+        if st.button("Apply substitution"):
+            live_assignments, live_order, live_available, changed = repair_lineup(
+                st.session_state["live_assignments"],
+                st.session_state["live_batting_order"],
+                live_available,
+                departing=None if departing == "(nobody)" else departing,
+                arriving=None if arriving == "(nobody)" else arriving,
+            )
+            if live_assignments is None:
+                st.error(f"Only {len(live_available)} players left, need 9 to field a team.")
+            else:
+                st.session_state["live_assignments"] = live_assignments
+                st.session_state["live_batting_order"] = live_order
+                st.session_state["live_available"] = live_available
+                st.success(f"Position changes: {', '.join(changed) if changed else 'none'}")
+
+        st.table([{"Position": pos, "Player": player} for pos, player in st.session_state["live_assignments"].items()])
+        st.table(pd.DataFrame(
+            st.session_state["live_batting_order"], index=range(1, len(st.session_state["live_batting_order"]) + 1), columns=["Player"]
+        ).rename_axis("Batting Position"))
+
+    # --- Season-long playing-time fairness ---
+    if st.checkbox("Show Season Fairness Scheduler"):
+        st.header("Season Scheduler")
+        df_history = load_lineup_history(season)
+        next_game = int(df_history["Game"].max()) + 1 if not df_history.empty else 1
+        num_games = st.number_input("Upcoming games to schedule", min_value=1, max_value=8, value=3)
+        bench_weight = st.slider("Bench fairness weight", 0, 2000, BENCH_FAIRNESS_WEIGHT, step=50)
+        infield_weight = st.slider("Infield share weight", 0, 1000, INFIELD_FAIRNESS_WEIGHT, step=50)
+
+        upcoming = {}
+        for game in range(next_game, next_game + num_games):
+            upcoming[game] = st.multiselect(
+                f"Available for game {game}", list(all_players_info), default=available_players, key=f"sched_avail_{game}"
+            )
+
+        # Keep the solved season around so an availability change only re-solves what it touches.
+        # The scheduler scores with the roster tables and fielding model, so a change to either
+        # (guest athleticism, fielding data toggled) starts a fresh one.
+        scheduler_key = (
+            season, bench_weight, infield_weight, len(df_history), lineup_inputs["roster"], lineup_inputs["fielding_events"]
+        )
+        scheduler = st.session_state.get("season_scheduler")
+        if scheduler is None or st.session_state.get("season_scheduler_key") != scheduler_key:
+            scheduler = SeasonScheduler(df_history, bench_weight, infield_weight)
+            scheduler.schedule(upcoming)
+            st.session_state["season_scheduler"] = scheduler
+            st.session_state["season_scheduler_key"] = scheduler_key
+        else:
+            for game in [g for g in scheduler.games if g not in upcoming]:
+                scheduler.drop_game(game)
+            for game, players in upcoming.items():
+                if game not in scheduler.games or sorted(scheduler.games[game]["available"]) != sorted(players):
+                    scheduler.update_availability(game, players)
+
+        for game, entry in scheduler.games.items():
+            st.subheader(f"Game {game}")
+            if entry["assignments"] is None:
+                st.warning(f"Only {len(entry['available'])} players available for game {game}, need 9.")
+                continue
+            st.table([{"Position": pos, "Player": player} for pos, player in entry["assignments"].items()])
+            bench = [p for p in entry["available"] if p not in entry["assignments"].values()]
+            st.write("Bench: " + (", ".join(bench) if bench else "nobody"))
+
+        st.subheader("Season Fairness")
+        st.dataframe(scheduler.fairness_table(), use_container_width=True, hide_index=True)
+        st.caption("Totals include past games from lineup_history.csv plus the games scheduled above.")
+        st.download_button(
+            label="📋 Download scheduled lineups",
+            data=scheduler.to_history(season).to_csv(index=False),
+            file_name="scheduled_lineups.csv",
+            mime="text/csv",
+            help=f"Append played games to {LINEUP_HISTORY_FILE} to keep fairness totals up to date"
+        )